@@ -56,6 +56,7 @@ taha
     'data': [
      
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         
         
         'views/product_template_view.xml',
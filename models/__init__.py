@@ -2,3 +2,4 @@ from . import product_template
 from . import pos_order
 from . import pos_session
 from . import mrp_production
+from . import mrp_bom
@@ -0,0 +1,24 @@
+
+
+from odoo import models
+from odoo.tools.sql import create_index
+
+
+class MrpBom(models.Model):
+    _inherit = 'mrp.bom'
+
+    # ============================================
+    # Override Methods
+    # ============================================
+    
+    def init(self):
+        super().init()
+        # Partial index matching the POS BOM lookups, which only ever look for
+        # active BOMs of type "Manufacture this product" of a template
+        create_index(
+            self.env.cr,
+            'mrp_bom_pos_lookup_idx',
+            self._table,
+            ['product_tmpl_id', 'sequence'],
+            where="type = 'normal' AND active",
+        )
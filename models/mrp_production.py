@@ -1,6 +1,15 @@
 
 
+from collections import defaultdict
+
+from markupsafe import Markup, escape
+
 from odoo import models, fields, api, _
+from odoo.tools.sql import drop_index, make_index_name
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
 
 
 class MrpProduction(models.Model):
@@ -14,7 +23,7 @@ class MrpProduction(models.Model):
         'pos.order',
         string='POS Order',
         ondelete='set null',
-        index=True,
+        index='btree_not_null',
         copy=False,
         help='The POS order that triggered this manufacturing order.'
     )
@@ -23,7 +32,7 @@ class MrpProduction(models.Model):
         'pos.order.line',
         string='POS Order Line',
         ondelete='set null',
-        index=True,
+        index='btree_not_null',
         copy=False,
         help='The specific POS order line that triggered this manufacturing order.'
     )
@@ -31,14 +40,12 @@ class MrpProduction(models.Model):
     pos_order_name = fields.Char(
         string='POS Order Reference',
         related='pos_order_id.name',
-        store=True,
         readonly=True
     )
     
     pos_order_date = fields.Datetime(
         string='POS Order Date',
         related='pos_order_id.date_order',
-        store=True,
         readonly=True
     )
     
@@ -47,6 +54,7 @@ class MrpProduction(models.Model):
         string='POS Session',
         related='pos_order_id.session_id',
         store=True,
+        index=True,
         readonly=True
     )
     
@@ -57,11 +65,26 @@ class MrpProduction(models.Model):
         help='Indicates if this manufacturing order was created from a POS sale.'
     )
     
+    pos_mrp_pending_confirm = fields.Boolean(
+        string='Pending POS Confirmation',
+        default=False,
+        copy=False,
+        help='Set on manufacturing orders created from POS for auto-confirmed products. '
+             'They are confirmed shortly after the sale by a scheduled action.'
+    )
+    
+    pos_mrp_confirm_failed = fields.Boolean(
+        string='POS Confirmation Failed',
+        default=False,
+        copy=False,
+        help='Set when the scheduled action could not confirm this manufacturing order. '
+             'Clear it to have the confirmation retried.'
+    )
+    
     pos_partner_id = fields.Many2one(
         'res.partner',
         string='POS Customer',
         related='pos_order_id.partner_id',
-        store=True,
         readonly=True
     )
 
@@ -98,6 +121,25 @@ class MrpProduction(models.Model):
     # Override Methods
     # ============================================
     
+    def init(self):
+        super().init()
+        # Databases installed before the POS links became partial indexes still
+        # have full indexes under the same names, which Odoo keeps as they are:
+        # drop them so they get recreated with their WHERE clause
+        index_names = tuple(
+            make_index_name(self._table, field_name)
+            for field_name in ('pos_order_id', 'pos_order_line_id')
+        )
+        self.env.cr.execute("""
+            SELECT indexname
+              FROM pg_indexes
+             WHERE tablename = %s
+               AND indexname IN %s
+               AND indexdef NOT LIKE '%%WHERE%%'
+        """, [self._table, index_names])
+        for (index_name,) in self.env.cr.fetchall():
+            drop_index(self.env.cr, index_name, self._table)
+    
     def button_mark_done(self):
         """
         Override to add POS-specific logic when production is completed.
@@ -110,9 +152,15 @@ class MrpProduction(models.Model):
         result = super().button_mark_done()
         
         # Log completion for POS orders
-        for production in self.filtered('is_from_pos'):
-            production.message_post(
-                body=_('Manufacturing completed for POS Order: %s') % production.pos_order_name,
+        pos_productions = self.filtered('is_from_pos')
+        if pos_productions:
+            pos_productions._message_log_batch(
+                bodies={
+                    production.id: escape(
+                        _('Manufacturing completed for POS Order: %s') % production.pos_order_name
+                    )
+                    for production in pos_productions
+                },
                 message_type='notification'
             )
         
@@ -122,15 +170,99 @@ class MrpProduction(models.Model):
         """Add warning when canceling POS-originated MOs."""
         pos_productions = self.filtered('is_from_pos')
         if pos_productions:
-            # Log the cancellation
+            # Log the cancellation, one message per POS order
+            messages = defaultdict(list)
             for production in pos_productions:
-                production.pos_order_id.message_post(
-                    body=_('Manufacturing Order %s was cancelled.') % production.name,
-                    message_type='notification'
+                messages[production.pos_order_id.id].append(
+                    _('Manufacturing Order %s was cancelled.') % production.name
                 )
+            pos_productions.pos_order_id._message_log_batch(
+                bodies={
+                    order_id: Markup('<br/>').join(order_messages)
+                    for order_id, order_messages in messages.items()
+                },
+                message_type='notification'
+            )
         
         return super().action_cancel()
 
+    # ============================================
+    # Scheduled Actions
+    # ============================================
+    
+    @api.model
+    def _cron_confirm_pos_productions(self, batch_size=100):
+        """
+        Confirm manufacturing orders created from POS with auto-confirm enabled.
+        
+        Orders are confirmed in batches, in the company of each order, and each
+        batch is committed before the next one. When a batch fails, its orders
+        are confirmed one by one: a faulty order stays in draft, flagged as
+        failed, without blocking the others.
+        
+        :param batch_size: number of manufacturing orders confirmed at once
+        """
+        IrCron = self.env['ir.cron']
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        domain = [
+            ('pos_mrp_pending_confirm', '=', True),
+            ('pos_mrp_confirm_failed', '=', False),
+        ]
+        remaining = self.search_count(domain)
+        
+        while True:
+            productions = self.search(domain, limit=batch_size, order='id')
+            if not productions:
+                break
+            
+            drafts = productions.filtered(lambda production: production.state == 'draft')
+            failed = self.browse()
+            for company, company_drafts in drafts.grouped('company_id').items():
+                failed |= company_drafts.with_company(company)._confirm_pos_productions()
+            
+            (productions - failed).write({'pos_mrp_pending_confirm': False})
+            failed.write({'pos_mrp_confirm_failed': True})
+            
+            remaining = max(remaining - len(productions), 0)
+            if hasattr(IrCron, '_commit_progress'):
+                # Odoo 19: commits, and tells how much time the job has left
+                if IrCron._commit_progress(len(productions), remaining=remaining) <= 0:
+                    break
+            else:
+                IrCron._notify_progress(done=len(productions), remaining=remaining)
+                if auto_commit:
+                    self.env.cr.commit()
+
+    def _confirm_pos_productions(self):
+        """
+        Confirm draft manufacturing orders, falling back to one by one on failure.
+        
+        :return: mrp.production records that could not be confirmed
+        """
+        try:
+            with self.env.cr.savepoint():
+                self.action_confirm()
+            return self.browse()
+        except Exception:
+            pass
+        
+        failed = self.browse()
+        for production in self:
+            try:
+                with self.env.cr.savepoint():
+                    production.action_confirm()
+            except Exception as e:
+                _logger.error(
+                    'Failed to confirm MO %s for POS order %s: %s',
+                    production.name, production.pos_order_name, str(e)
+                )
+                production.message_post(
+                    body=_('Automatic confirmation failed: %s') % str(e),
+                    message_type='notification'
+                )
+                failed |= production
+        return failed
+
     # ============================================
     # Business Methods
     # ============================================
@@ -1,5 +1,7 @@
 
 
+from markupsafe import escape
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 import logging
@@ -30,7 +32,7 @@ class PosOrder(models.Model):
     has_mrp_products = fields.Boolean(
         string='Has Manufacturing Products',
         compute='_compute_has_mrp_products',
-        store=True
+        search='_search_has_mrp_products'
     )
 
     # ============================================
@@ -39,16 +41,62 @@ class PosOrder(models.Model):
     
     @api.depends('mrp_production_ids')
     def _compute_mrp_production_count(self):
+        groups = self.env['mrp.production']._read_group(
+            [('pos_order_id', 'in', self._origin.ids)],
+            ['pos_order_id'],
+            ['__count'],
+        )
+        counts = {order.id: count for order, count in groups}
         for order in self:
-            order.mrp_production_count = len(order.mrp_production_ids)
+            order.mrp_production_count = counts.get(order._origin.id, 0)
 
-    @api.depends('lines.product_id.product_tmpl_id.pos_mrp_enabled')
+    @api.depends('lines.product_id')
     def _compute_has_mrp_products(self):
+        # Find saved orders with manufactured products in one query
+        saved_orders = self.filtered('id')
+        mrp_order_ids = set()
+        if saved_orders:
+            self.env['pos.order.line'].flush_model(['order_id', 'product_id'])
+            self.env['product.product'].flush_model(['product_tmpl_id'])
+            self.env['product.template'].flush_model(['pos_mrp_enabled'])
+            self.env.cr.execute("""
+                SELECT DISTINCT pol.order_id
+                  FROM pos_order_line pol
+                  JOIN product_product pp ON pp.id = pol.product_id
+                  JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                 WHERE pol.order_id IN %s
+                   AND pt.pos_mrp_enabled
+            """, [tuple(saved_orders.ids)])
+            mrp_order_ids = {row[0] for row in self.env.cr.fetchall()}
+        
         for order in self:
-            order.has_mrp_products = any(
-                line.product_id.product_tmpl_id.pos_mrp_enabled 
-                for line in order.lines
-            )
+            if order.id:
+                order.has_mrp_products = order.id in mrp_order_ids
+            else:
+                # New records are not in the database yet
+                order.has_mrp_products = any(
+                    line.product_id.product_tmpl_id.pos_mrp_enabled 
+                    for line in order.lines
+                )
+
+    def _search_has_mrp_products(self, operator, value):
+        """Search orders through their lines instead of a stored flag."""
+        # Odoo 19 turns '=' and '!=' into 'in' and 'not in' before calling this
+        if operator in ('=', '!=') and isinstance(value, bool):
+            wanted = {value}
+        elif operator in ('in', 'not in') and isinstance(value, (list, tuple, set, frozenset)):
+            wanted = {bool(val) for val in value}
+        else:
+            return NotImplemented
+        if operator in ('!=', 'not in'):
+            wanted = {True, False} - wanted
+        
+        domain = [('lines.product_id.product_tmpl_id.pos_mrp_enabled', '=', True)]
+        if wanted == {True}:
+            return domain
+        if wanted == {False}:
+            return ['!'] + domain
+        return [(1, '=', 1)] if wanted else [(0, '=', 1)]
 
     # ============================================
     # Action Methods
@@ -83,6 +131,9 @@ class PosOrder(models.Model):
         check material availability.
         Called before payment processing.
         
+        The availability check is skipped when the ``pos_mrp_availability_checked``
+        context key is set, i.e. when sync_from_ui() already checked the order.
+        
         :raises UserError: If any product requires manufacturing but has no BOM
         :raises UserError: If material availability check is enabled and components are missing
         """
@@ -98,44 +149,57 @@ class PosOrder(models.Model):
             if picking_type and picking_type.warehouse_id:
                 warehouse_id = picking_type.warehouse_id.id
         
-        for line in self.lines:
-            product_tmpl = line.product_id.product_tmpl_id
-            if product_tmpl.pos_mrp_enabled:
-                # Check BOM exists
-                bom = product_tmpl.get_pos_bom(
-                    product_id=line.product_id.id,
-                    company_id=self.company_id.id
-                )
-                if not bom:
-                    invalid_products.append(line.product_id.display_name)
-                    continue
+        check_availability = not self.env.context.get('pos_mrp_availability_checked')
+        
+        mrp_lines = self.lines.filtered(
+            lambda line: line.product_id.product_tmpl_id.pos_mrp_enabled
+        )
+        bom_map = self.env['product.template'].get_pos_bom_bulk(
+            mrp_lines.product_id.ids,
+            company_id=self.company_id.id
+        )
+        
+        # Check material availability of all lines at once
+        needs = {}
+        if check_availability:
+            needs = {
+                line.id: (line.product_id.id, line.qty, self.company_id.id, warehouse_id)
+                for line in mrp_lines
+                if line.product_id.product_tmpl_id.pos_mrp_check_availability
+                and bom_map.get(line.product_id.id)
+            }
+        availabilities = self.env['product.template'].check_components_availability_bulk(
+            needs.values()
+        )
+        
+        for line in mrp_lines:
+            # Check BOM exists
+            bom = bom_map.get(line.product_id.id)
+            if not bom:
+                invalid_products.append(line.product_id.display_name)
+                continue
+            
+            # Check material availability if enabled
+            if line.id in needs:
+                availability = availabilities[needs[line.id]]
                 
-                # Check material availability if enabled
-                if product_tmpl.pos_mrp_check_availability:
-                    availability = product_tmpl.check_components_availability(
-                        product_id=line.product_id.id,
-                        quantity=line.qty,
-                        company_id=self.company_id.id,
-                        warehouse_id=warehouse_id
-                    )
+                if not availability['available']:
+                    missing_info = []
+                    for comp in availability['missing_components']:
+                        if 'reason' in comp:
+                            missing_info.append(f"  - {comp['reason']}")
+                        else:
+                            missing_info.append(
+                                f"  - {comp['product']}: "
+                                f"Required {comp['required']} {comp.get('uom', '')}, "
+                                f"Available {comp['available']} "
+                                f"(Shortage: {comp['shortage']})"
+                            )
                     
-                    if not availability['available']:
-                        missing_info = []
-                        for comp in availability['missing_components']:
-                            if 'reason' in comp:
-                                missing_info.append(f"  - {comp['reason']}")
-                            else:
-                                missing_info.append(
-                                    f"  - {comp['product']}: "
-                                    f"Required {comp['required']} {comp.get('uom', '')}, "
-                                    f"Available {comp['available']} "
-                                    f"(Shortage: {comp['shortage']})"
-                                )
-                        
-                        unavailable_products.append({
-                            'product': line.product_id.display_name,
-                            'missing': missing_info
-                        })
+                    unavailable_products.append({
+                        'product': line.product_id.display_name,
+                        'missing': missing_info
+                    })
         
         # Raise error for missing BOMs
         if invalid_products:
@@ -166,30 +230,44 @@ class PosOrder(models.Model):
         """
         Create Manufacturing Orders for all MRP-enabled products in this order.
         
-        Design Decision: One MO per order line
-        - Each POS order line generates one Manufacturing Order
-        - This provides clear traceability between POS sale and production
-        - Allows independent tracking of each product's manufacturing status
+        Design Decision: One MO per product and BOM
+        - Lines of the same product and BOM generate one Manufacturing Order
+          for their total quantity
+        - The MO is linked to the first of these lines, and a note on the MO
+          lists all of them when there are several
+        - Keeps the number of MOs, stock moves and messages proportional to the
+          distinct products sold rather than to the number of lines
         
         :return: recordset of created mrp.production records
         """
         self.ensure_one()
         
-        MrpProduction = self.env['mrp.production']
-        created_productions = MrpProduction
+        # Creation messages, follower subscription and tracking are not needed for
+        # MOs generated in bulk
+        MrpProduction = self.env['mrp.production'].with_context(
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+            mail_notrack=True,
+        )
+        
+        # Skip non-MRP products and zero quantity lines
+        mrp_lines = self.lines.filtered(
+            lambda line: line.product_id.product_tmpl_id.pos_mrp_enabled and line.qty > 0
+        )
         
-        for line in self.lines:
-            product_tmpl = line.product_id.product_tmpl_id
-            
-            # Skip non-MRP products and zero quantity lines
-            if not product_tmpl.pos_mrp_enabled or line.qty <= 0:
-                continue
-            
-            # Get BOM for this product
-            bom = product_tmpl.get_pos_bom(
-                product_id=line.product_id.id,
-                company_id=self.company_id.id
-            )
+        # Get BOMs of all products at once
+        bom_map = self.env['product.template'].get_pos_bom_bulk(
+            mrp_lines.product_id.ids,
+            company_id=self.company_id.id
+        )
+        
+        # Same manufacturing operation type for every line of the order
+        picking_type = self._get_mrp_picking_type()
+        
+        # Group lines of the same product and BOM (dicts keep the order of the lines)
+        grouped_lines = {}
+        for line in mrp_lines:
+            bom = bom_map.get(line.product_id.id)
             
             if not bom:
                 _logger.warning(
@@ -198,63 +276,113 @@ class PosOrder(models.Model):
                 )
                 continue
             
-            # Prepare MO values
-            production_vals = self._prepare_mrp_production_vals(line, bom)
-            
-            try:
-                production = MrpProduction.create(production_vals)
-                
-                # Auto-confirm if configured
-                if product_tmpl.pos_mrp_auto_confirm:
-                    production.action_confirm()
-                    _logger.info(
-                        'Created and confirmed MO %s for POS order %s, product %s',
-                        production.name, self.name, line.product_id.display_name
-                    )
-                else:
-                    _logger.info(
-                        'Created draft MO %s for POS order %s, product %s',
-                        production.name, self.name, line.product_id.display_name
-                    )
-                
-                created_productions |= production
-                
-            except Exception as e:
-                _logger.error(
-                    'Failed to create MO for POS order %s, product %s: %s',
-                    self.name, line.product_id.display_name, str(e)
-                )
-                raise UserError(_(
-                    'Failed to create Manufacturing Order for product "%s".\n'
-                    'Error: %s'
-                ) % (line.product_id.display_name, str(e)))
+            key = (line.product_id, bom)
+            grouped_lines[key] = grouped_lines.get(key, self.env['pos.order.line']) | line
+        
+        if not grouped_lines:
+            return self.env['mrp.production']
+        
+        # Prepare MO values
+        lines_to_produce = list(grouped_lines.values())
+        production_vals_list = [
+            self._prepare_mrp_production_vals(lines, bom, picking_type=picking_type)
+            for (_product, bom), lines in grouped_lines.items()
+        ]
+        
+        # Create all MOs at once; on failure, retry one by one to find the faulty line
+        try:
+            with self.env.cr.savepoint():
+                productions = MrpProduction.create(production_vals_list)
+        except Exception:
+            productions = MrpProduction
+            for lines, production_vals in zip(lines_to_produce, production_vals_list):
+                try:
+                    with self.env.cr.savepoint():
+                        productions |= MrpProduction.create(production_vals)
+                except Exception as e:
+                    self._raise_mrp_production_error(lines[0], e)
+        
+        # Keep track of all source lines of MOs grouping several lines
+        multi_line_bodies = {
+            production.id: escape(_('Created from POS order lines: %s') % ', '.join(
+                f'{line.full_product_name or line.product_id.display_name} ({line.qty:g})'
+                for line in lines
+            ))
+            for production, lines in zip(productions, lines_to_produce)
+            if len(lines) > 1
+        }
+        if multi_line_bodies:
+            productions._message_log_batch(
+                bodies=multi_line_bodies,
+                message_type='notification'
+            )
+        
+        # Auto-confirm is deferred to a scheduled action to keep the POS payment fast
+        to_confirm = productions.filtered('pos_mrp_pending_confirm')
+        if to_confirm:
+            cron = self.env.ref(
+                'pos_mrp_integration.ir_cron_confirm_pos_productions',
+                raise_if_not_found=False
+            )
+            if cron:
+                cron._trigger()
+        
+        if _logger.isEnabledFor(logging.INFO):
+            _logger.info(
+                'POS order %s: created %d MOs (%d queued for confirmation): %s',
+                self.name, len(productions), len(to_confirm),
+                ', '.join(productions.mapped('name'))
+            )
         
-        return created_productions
+        return productions.with_env(self.env)
 
-    def _prepare_mrp_production_vals(self, line, bom):
+    def _raise_mrp_production_error(self, line, error):
+        """
+        Log and raise a user-facing error for a MO that could not be created.
+        
+        Confirmation errors are handled by mrp.production._cron_confirm_pos_productions().
+        
+        :param line: pos.order.line record the MO was created for
+        :param error: the original exception
+        :raises UserError: always
+        """
+        self.ensure_one()
+        _logger.error(
+            'Failed to create MO for POS order %s, product %s: %s',
+            self.name, line.product_id.display_name, str(error)
+        )
+        raise UserError(_(
+            'Failed to create Manufacturing Order for product "%s".\n'
+            'Error: %s'
+        ) % (line.product_id.display_name, str(error)))
+
+    def _prepare_mrp_production_vals(self, lines, bom, picking_type=None):
         """
         Prepare values for manufacturing order creation.
         
-        :param line: pos.order.line record
+        :param lines: pos.order.line records of the same product, produced by one MO
         :param bom: mrp.bom record
+        :param picking_type: Optional stock.picking.type record, looked up when not given
         :return: dict of values for mrp.production.create()
         """
         self.ensure_one()
         
         # Get the picking type for manufacturing
-        picking_type = self._get_mrp_picking_type()
+        if picking_type is None:
+            picking_type = self._get_mrp_picking_type()
         
         return {
-            'product_id': line.product_id.id,
-            'product_qty': line.qty,
-            'product_uom_id': line.product_id.uom_id.id,
+            'product_id': lines.product_id.id,
+            'product_qty': sum(lines.mapped('qty')),
+            'product_uom_id': lines.product_id.uom_id.id,
             'bom_id': bom.id,
             'pos_order_id': self.id,
-            'pos_order_line_id': line.id,
+            'pos_order_line_id': lines[:1].id,
             'origin': self.name,
             'company_id': self.company_id.id,
             'picking_type_id': picking_type.id if picking_type else False,
             'user_id': self.env.user.id,
+            'pos_mrp_pending_confirm': lines.product_id.product_tmpl_id.pos_mrp_auto_confirm,
         }
 
     def _get_mrp_picking_type(self):
@@ -300,14 +428,48 @@ class PosOrder(models.Model):
         valid_orders = []
         blocked_orders = []
         
+        # Parse the line payloads once, and check existence of the products of the
+        # whole batch at once
+        orders_product_qtys = [self._get_mrp_line_quantities(order_data) for order_data in orders]
+        products = self.env['product.product'].browse(list({
+            product_id
+            for product_qtys in orders_product_qtys
+            for product_id, _qty in product_qtys
+        })).exists()
+        
+        # Resolve the company and warehouse of every session of the batch at once
+        session_locations = self._get_mrp_session_locations({
+            order_data.get('data', order_data).get('pos_session_id')
+            for order_data in orders
+        })
+        
+        # Check material availability for the whole batch at once
+        orders_needs = [
+            self._get_mrp_availability_needs(
+                order_data, products=products, session_locations=session_locations,
+                product_qtys=product_qtys,
+            )
+            for order_data, product_qtys in zip(orders, orders_product_qtys)
+        ]
+        availability = self.env['product.template'].check_components_availability_bulk(
+            need
+            for needs in orders_needs
+            for _product, need in needs
+        )
+        
         # Validate each order
-        for order_data in orders:
-            validation_error = self._check_mrp_availability_for_order(order_data)
+        for order_data, needs in zip(orders, orders_needs):
+            validation_error = self._check_mrp_availability_for_order(
+                order_data, availability=availability, needs=needs
+            )
             if validation_error:
                 blocked_orders.append((order_data, validation_error))
             else:
                 valid_orders.append(order_data)
         
+        # Availability is not checked again when the orders get paid
+        checked_self = self.with_context(pos_mrp_availability_checked=True)
+        
         # Scenario 1: Single order failed (User just clicked Pay)
         if len(orders) == 1 and blocked_orders:
             # Raise error to notify user immediately
@@ -327,42 +489,31 @@ class PosOrder(models.Model):
                 # The POS will keep them in queue.
                 return {'pos.order': []}
                 
-            return super().sync_from_ui(valid_orders)
+            return super(PosOrder, checked_self).sync_from_ui(valid_orders)
             
         # Scenario 3: All Valid
-        return super().sync_from_ui(orders)
+        return super(PosOrder, checked_self).sync_from_ui(orders)
     
     @api.model
-    def _check_mrp_availability_for_order(self, order_data):
+    def _get_mrp_line_quantities(self, order_data):
         """
-        Check material availability for MRP products in order.
-        Returns error message string if unavailable, None if OK.
+        Extract the products and quantities sold in an order payload.
+        
+        :param order_data: order payload as received by sync_from_ui()
+        :return: list of (product_id, qty) tuples, product_id being an int
         """
         data = order_data.get('data', order_data)
         lines = data.get('lines', [])
-        order_name = data.get('name', 'Unknown Order')
-        
-        if not lines:
-            return None
-        
-        # Get session info
-        session_id = data.get('pos_session_id')
-        session = self.env['pos.session'].browse(session_id) if session_id else False
-        
-        warehouse_id = None
-        company_id = self.env.company.id
-        
-        if session and session.exists():
-            company_id = session.company_id.id
-            if session.config_id and session.config_id.picking_type_id:
-                warehouse = session.config_id.picking_type_id.warehouse_id
-                if warehouse:
-                    warehouse_id = warehouse.id
         
-        unavailable = []
+        product_qtys = []
         
-        for idx, line_data in enumerate(lines):
-            line_vals = line_data[2] if isinstance(line_data, (list, tuple)) and len(line_data) >= 3 else line_data if isinstance(line_data, dict) else None
+        for line_data in lines:
+            # Lines are ORM commands, (0, 0, vals) and (1, id, vals) carrying values
+            # but (2, id) and (3, id) not, or plain dicts
+            if isinstance(line_data, (list, tuple)):
+                line_vals = line_data[2] if len(line_data) >= 3 and isinstance(line_data[2], dict) else None
+            else:
+                line_vals = line_data if isinstance(line_data, dict) else None
             
             if not line_vals:
                 continue
@@ -375,12 +526,54 @@ class PosOrder(models.Model):
             
             # Ensure product_id is an integer
             try:
-                product_id = int(product_id)
+                product_qtys.append((int(product_id), qty))
             except (ValueError, TypeError):
                 continue
+        
+        return product_qtys
 
-            product = self.env['product.product'].browse(product_id)
-            if not product.exists():
+    @api.model
+    def _get_mrp_availability_needs(self, order_data, products=None, session_locations=None, product_qtys=None):
+        """
+        Collect the lines of an order payload that require a material availability check.
+        
+        :param order_data: order payload as received by sync_from_ui()
+        :param products: optional product.product recordset of existing products,
+                         checked for the whole batch by the caller
+        :param session_locations: optional result of _get_mrp_session_locations()
+                                  covering this order's session
+        :param product_qtys: optional result of _get_mrp_line_quantities() for this
+                             order, parsed by the caller
+        :return: list of (product, need) tuples, need being a
+                 (product_id, quantity, company_id, warehouse_id) tuple as expected by
+                 product.template.check_components_availability_bulk()
+        """
+        if product_qtys is None:
+            product_qtys = self._get_mrp_line_quantities(order_data)
+        
+        if not product_qtys:
+            return []
+        
+        data = order_data.get('data', order_data)
+        
+        # Get session info
+        session_id = data.get('pos_session_id')
+        if session_locations is None:
+            session_locations = self._get_mrp_session_locations([session_id])
+        company_id, warehouse_id = session_locations.get(session_id, (self.env.company.id, None))
+        
+        # Check existence of all products at once, which also prefetches them together
+        if products is None:
+            products = self.env['product.product'].browse(
+                list({product_id for product_id, _qty in product_qtys})
+            ).exists()
+        product_by_id = {product.id: product for product in products}
+        
+        needs = []
+        
+        for product_id, qty in product_qtys:
+            product = product_by_id.get(product_id)
+            if not product:
                 continue
             
             product_tmpl = product.product_tmpl_id
@@ -392,26 +585,78 @@ class PosOrder(models.Model):
             if not product_tmpl.pos_mrp_check_availability:
                 continue
             
-            availability = product_tmpl.check_components_availability(
-                product_id=product_id,
-                quantity=qty,
-                company_id=company_id,
-                warehouse_id=warehouse_id
+            needs.append((product, (product_id, qty, company_id, warehouse_id)))
+        
+        return needs
+
+    @api.model
+    def _get_mrp_session_locations(self, session_ids):
+        """
+        Get the company and warehouse used for availability checks of POS sessions.
+        
+        :param session_ids: pos.session IDs, falsy values are ignored
+        :return: dict mapping session_id to a (company_id, warehouse_id) tuple,
+                 warehouse_id being None when the session config has none
+        """
+        sessions = self.env['pos.session'].browse([
+            session_id for session_id in session_ids if session_id
+        ]).exists()
+        
+        # Fetch configs, picking types and warehouses of all sessions together
+        sessions.config_id.picking_type_id.warehouse_id
+        
+        return {
+            session.id: (
+                session.company_id.id,
+                session.config_id.picking_type_id.warehouse_id.id or None,
             )
-            
-            if not availability['available']:
-                details = []
-                for comp in availability['missing_components']:
-                    if 'reason' in comp:
-                        details.append(comp['reason'])
-                    else:
-                        details.append(f"{comp['product']}: مطلوب {comp['required']:.2f}, متوفر {comp['available']:.2f}")
-                unavailable.append(f"📦 {product.display_name}: " + ", ".join(details))
-        
-        if unavailable:
-            return f"طلب {order_name}:\nالمواد الخام غير كافية للتصنيع:\n" + "\n".join(unavailable)
-        
-        return None
+            for session in sessions
+        }
+
+    @api.model
+    def _check_mrp_availability_for_order(self, order_data, availability=None, needs=None):
+        """
+        Check material availability for MRP products in order.
+        Returns error message string if unavailable, None if OK.
+        
+        :param order_data: order payload as received by sync_from_ui()
+        :param availability: optional result of
+                             product.template.check_components_availability_bulk()
+                             already covering this order's lines
+        :param needs: optional result of _get_mrp_availability_needs() for this order
+        """
+        data = order_data.get('data', order_data)
+        order_name = data.get('name', 'Unknown Order')
+        
+        if needs is None:
+            needs = self._get_mrp_availability_needs(order_data)
+        if not needs:
+            return None
+        
+        if availability is None:
+            availability = self.env['product.template'].check_components_availability_bulk(
+                need for _product, need in needs
+            )
+        
+        # Only keep the failing results, the message is built once at the end
+        unavailable = [
+            (product, availability[need]['missing_components'])
+            for product, need in needs
+            if not availability[need]['available']
+        ]
+        
+        if not unavailable:
+            return None
+        
+        def format_component(comp):
+            if 'reason' in comp:
+                return comp['reason']
+            return f"{comp['product']}: مطلوب {comp['required']:.2f}, متوفر {comp['available']:.2f}"
+        
+        return f"طلب {order_name}:\nالمواد الخام غير كافية للتصنيع:\n" + "\n".join(
+            f"📦 {product.display_name}: " + ", ".join(map(format_component, missing_components))
+            for product, missing_components in unavailable
+        )
 
     def action_pos_order_paid(self):
         """
@@ -422,17 +667,19 @@ class PosOrder(models.Model):
         2. Process payment (original method)
         3. Create Manufacturing Orders
         """
+        # Orders without manufactured products skip both MRP phases
+        mrp_orders = self.filtered('has_mrp_products')
+        
         # Validate before processing payment (backup validation)
-        for order in self:
+        for order in mrp_orders:
             order._validate_mrp_products()
         
         # Call original method
         result = super().action_pos_order_paid()
         
         # Create manufacturing orders after successful payment
-        for order in self:
-            if order.has_mrp_products:
-                order._create_manufacturing_orders()
+        for order in mrp_orders:
+            order._create_manufacturing_orders()
         
         return result
 
@@ -470,8 +717,10 @@ class PosOrderLine(models.Model):
     
     @api.depends('product_id.product_tmpl_id.pos_mrp_enabled')
     def _compute_requires_manufacturing(self):
+        # Fetch the templates of all lines at once instead of line by line
+        self.product_id.product_tmpl_id.mapped('pos_mrp_enabled')
         for line in self:
-            line.requires_manufacturing = (
+            line.requires_manufacturing = bool(
                 line.product_id and 
                 line.product_id.product_tmpl_id.pos_mrp_enabled
             )
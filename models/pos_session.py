@@ -21,10 +21,14 @@ class PosSession(models.Model):
     
     def _compute_mrp_production_count(self):
         """Count all MOs created from orders in this session."""
+        groups = self.env['mrp.production']._read_group(
+            [('pos_session_id', 'in', self._origin.ids)],
+            ['pos_session_id'],
+            ['__count'],
+        )
+        counts = {session.id: count for session, count in groups}
         for session in self:
-            session.mrp_production_count = self.env['mrp.production'].search_count([
-                ('pos_session_id', '=', session.id)
-            ])
+            session.mrp_production_count = counts.get(session._origin.id, 0)
 
     # ============================================
     # Action Methods
@@ -1,7 +1,10 @@
 
 
+from collections import defaultdict
+
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import MissingError, ValidationError
+from odoo.tools import float_compare
 
 
 class ProductTemplate(models.Model):
@@ -28,7 +31,7 @@ class ProductTemplate(models.Model):
     pos_bom_id = fields.Many2one(
         'mrp.bom',
         string='POS Bill of Materials',
-        domain="[('product_tmpl_id', '=', id), ('type', '=', 'normal')]",
+        domain="[('product_tmpl_id', '=', id), ('type', '=', 'normal'), ('active', '=', True)]",
         help='Bill of Materials to use when creating manufacturing orders from POS. '
              'If not set, the default BOM will be used.'
     )
@@ -63,23 +66,36 @@ class ProductTemplate(models.Model):
     @api.depends('pos_mrp_enabled', 'bom_ids', 'pos_bom_id')
     def _compute_pos_mrp_ready(self):
         """Check if product is ready for POS manufacturing."""
+        # Only enabled templates without a POS BOM need their BOMs looked up, so
+        # mass BOM imports on regular products do not query anything
+        to_check = []
         for product in self:
             if not product.pos_mrp_enabled:
                 product.pos_mrp_ready = False
-                continue
-            
-            # Check if there's a valid BOM
-            has_valid_bom = bool(product.pos_bom_id) or bool(
-                product.bom_ids.filtered(lambda b: b.type == 'normal' and b.active)
-            )
-            product.pos_mrp_ready = has_valid_bom
+            elif product.pos_bom_id:
+                product.pos_mrp_ready = True
+            else:
+                to_check.append(product.id)
+        
+        if not to_check:
+            return
+        
+        # Check if there's a valid BOM
+        to_check = self.browse(to_check)
+        bom_map = to_check._get_active_normal_bom_map()
+        for product in to_check:
+            product.pos_mrp_ready = bool(bom_map.get(product._origin.id))
 
     def _compute_pos_bom_count(self):
         """Count available BOMs for this product."""
-        for product in self:
-            product.pos_bom_count = len(
-                product.bom_ids.filtered(lambda b: b.type == 'normal' and b.active)
+        counts = {}
+        if self._origin:
+            groups = self.env['mrp.bom']._read_group(
+                self._get_active_normal_bom_domain(), ['product_tmpl_id'], ['__count'],
             )
+            counts = {template.id: count for template, count in groups}
+        for product in self:
+            product.pos_bom_count = counts.get(product._origin.id, 0)
 
     # ============================================
     # Constraint Methods
@@ -88,15 +104,48 @@ class ProductTemplate(models.Model):
     @api.constrains('pos_mrp_enabled', 'pos_bom_id', 'bom_ids')
     def _check_pos_mrp_bom(self):
         """Ensure product has a valid BOM when POS MRP is enabled."""
-        for product in self:
-            if product.pos_mrp_enabled:
-                if not product.pos_bom_id and not product.bom_ids.filtered(
-                    lambda b: b.type == 'normal' and b.active
-                ):
-                    raise ValidationError(_(
-                        'Product "%s" requires a valid Bill of Materials (BOM) '
-                        'to enable manufacturing from POS. Please create a BOM first.'
-                    ) % product.name)
+        # Only enabled products without an explicit POS BOM need a lookup
+        violators = self.filtered(lambda p: p.pos_mrp_enabled and not p.pos_bom_id)
+        if not violators:
+            return
+        bom_map = violators._get_active_normal_bom_map()
+        for product in violators:
+            if not bom_map.get(product.id):
+                raise ValidationError(_(
+                    'Product "%s" requires a valid Bill of Materials (BOM) '
+                    'to enable manufacturing from POS. Please create a BOM first.'
+                ) % product.name)
+
+    # ============================================
+    # Helper Methods
+    # ============================================
+    
+    def _get_active_normal_bom_domain(self):
+        """
+        Get the domain of the active BOMs of type "Manufacture this product" of the
+        templates in self.
+        
+        :return: domain on mrp.bom
+        """
+        return [
+            ('product_tmpl_id', 'in', self._origin.ids),
+            ('type', '=', 'normal'),
+            ('active', '=', True),
+        ]
+
+    def _get_active_normal_bom_map(self):
+        """
+        Get the active BOMs of type "Manufacture this product" of the templates in self.
+        
+        :return: dict mapping template ID to a list of mrp.bom IDs
+        """
+        if not self._origin:
+            return {}
+        
+        groups = self.env['mrp.bom']._read_group(
+            self._get_active_normal_bom_domain(), ['product_tmpl_id'], ['id:array_agg'],
+        )
+        return {template.id: bom_ids for template, bom_ids in groups}
 
     # ============================================
     # Business Methods
@@ -106,6 +155,9 @@ class ProductTemplate(models.Model):
         """
         Get the appropriate BOM for POS manufacturing.
         
+        Not cached: to resolve several products, use get_pos_bom_bulk(), which
+        needs a single search for all of them.
+        
         :param product_id: Optional specific product variant
         :param company_id: Company to filter BOM by
         :return: mrp.bom record or False
@@ -116,21 +168,103 @@ class ProductTemplate(models.Model):
         if self.pos_bom_id:
             return self.pos_bom_id
         
+        # No default BOM lookup for products not manufactured from POS
+        if not self.pos_mrp_enabled:
+            return False
+        
         # Second priority: find default BOM
+        boms = self._get_pos_default_boms(
+            product_ids=[product_id] if product_id else None, company_id=company_id
+        )
+        return self._select_pos_bom(boms[self.id], product_id)
+
+    @api.model
+    def get_pos_bom_bulk(self, product_ids, company_id=None):
+        """
+        Get the POS BOM of several product variants with a single search.
+        
+        Follows the same priority as get_pos_bom(): the template's POS BOM first,
+        then the first default BOM matching the variant.
+        
+        :param product_ids: product.product IDs
+        :param company_id: Company to filter BOMs by
+        :return: dict mapping product_id to mrp.bom record or False
+        """
+        products = self.env['product.product'].browse(product_ids)
+        
+        bom_map = {}
+        to_search = self.env['product.product']
+        
+        for product in products:
+            template = product.product_tmpl_id
+            # First priority: explicitly set POS BOM
+            if template.pos_bom_id:
+                bom_map[product.id] = template.pos_bom_id
+            # No default BOM lookup for products not manufactured from POS
+            elif not template.pos_mrp_enabled:
+                bom_map[product.id] = False
+            else:
+                to_search |= product
+        
+        if not to_search:
+            return bom_map
+        
+        # Second priority: find default BOMs
+        boms_by_tmpl = to_search.product_tmpl_id._get_pos_default_boms(
+            product_ids=to_search.ids, company_id=company_id
+        )
+        for product in to_search:
+            bom_map[product.id] = self._select_pos_bom(
+                boms_by_tmpl[product.product_tmpl_id.id], product.id
+            )
+        
+        return bom_map
+
+    def _get_pos_default_boms(self, product_ids=None, company_id=None):
+        """
+        Get the candidate default BOMs of the templates in self with a single search.
+        
+        :param product_ids: Optional product.product IDs; if given, only BOMs of
+                            these variants or of no specific variant are returned
+        :param company_id: Company to filter BOMs by
+        :return: defaultdict mapping template ID to a list of mrp.bom records
+        """
         domain = [
-            ('product_tmpl_id', '=', self.id),
+            ('product_tmpl_id', 'in', self.ids),
             ('type', '=', 'normal'),
             ('active', '=', True),
         ]
         
-        if product_id:
-            domain.append(('product_id', 'in', [product_id, False]))
+        if product_ids:
+            domain.append(('product_id', 'in', list(product_ids) + [False]))
         
         if company_id:
             domain.append(('company_id', 'in', [company_id, False]))
         
-        bom = self.env['mrp.bom'].search(domain, limit=1, order='sequence, product_id desc')
-        return bom if bom else False
+        # A plain ORM search rather than a hand-written query: BOMs stay subject to
+        # record rules, and both get_pos_bom() and get_pos_bom_bulk() go through it
+        boms_by_tmpl = defaultdict(list)
+        boms = self.env['mrp.bom'].search_fetch(
+            domain, ['product_tmpl_id', 'product_id', 'sequence'], order='sequence, id'
+        )
+        for bom in boms:
+            boms_by_tmpl[bom.product_tmpl_id.id].append(bom)
+        return boms_by_tmpl
+
+    @api.model
+    def _select_pos_bom(self, boms, product_id=None):
+        """
+        Select the POS BOM among the default BOMs of a template.
+        
+        :param boms: mrp.bom records of one template, ordered by sequence and ID
+        :param product_id: Optional product variant ID the BOM must apply to
+        :return: mrp.bom record or False
+        """
+        # Lowest sequence first, a variant BOM winning over a generic one
+        return min((
+            bom for bom in boms
+            if not product_id or not bom.product_id or bom.product_id.id == product_id
+        ), key=lambda bom: (bom.sequence, not bom.product_id), default=False)
 
     def action_view_pos_bom(self):
         """Open BOMs related to this product."""
@@ -155,82 +289,232 @@ class ProductTemplate(models.Model):
         """
         self.ensure_one()
         
-        result = {
-            'available': True,
-            'missing_components': [],
+        # Without a specific variant, check the default variant
+        product_id = product_id or self.product_variant_id.id
+        if not product_id:
+            # Templates without any variant can neither be sold nor manufactured
+            return {'available': True, 'missing_components': []}
+        
+        need = (product_id, quantity, company_id, warehouse_id)
+        return self.check_components_availability_bulk([need])[need]
+
+    @api.model
+    def check_components_availability_bulk(self, needs):
+        """
+        Check BOM components availability for several products at once.
+        
+        BOMs are resolved with one search per company, stock locations once per
+        company and warehouse, and on-hand quantities with a single grouped
+        query for the whole batch.
+        
+        :param needs: iterable of (product_id, quantity, company_id, warehouse_id) tuples
+        :return: dict mapping each need to a result shaped like
+                 check_components_availability()
+        """
+        needs = set(needs)
+        if not needs:
+            return {}
+        
+        products = self.env['product.product'].browse(list({need[0] for need in needs}))
+        product_by_id = {product.id: product for product in products}
+        
+        # Products not manufactured from POS do not consume components
+        results = {
+            need: {'available': True, 'missing_components': []}
+            for need in needs
+            if not product_by_id[need[0]].product_tmpl_id.pos_mrp_enabled
         }
+        needs -= results.keys()
         
-        # Get BOM
-        bom = self.get_pos_bom(product_id=product_id, company_id=company_id)
-        if not bom:
-            result['available'] = False
-            result['missing_components'].append({
-                'product': self.name,
-                'required': quantity,
-                'available': 0,
-                'shortage': quantity,
-                'reason': _('No BOM found')
-            })
-            return result
-        
-        # Get BOM lines (components)
-        bom_lines = bom.bom_line_ids
-        
-        if not bom_lines:
-            # No components in BOM
-            return result
-        
-        # Get location for stock check
-        location = False
-        if warehouse_id:
-            warehouse = self.env['stock.warehouse'].browse(warehouse_id)
-            if warehouse.exists():
-                location = warehouse.lot_stock_id
-        
-        if not location:
-            # Use company's main warehouse
-            company = self.env['res.company'].browse(company_id) if company_id else self.env.company
-            warehouse = self.env['stock.warehouse'].search([
-                ('company_id', '=', company.id)
-            ], limit=1)
-            if warehouse:
-                location = warehouse.lot_stock_id
-        
-        if not location:
-            # Cannot check availability without location - block by default when check is enabled
-            result['available'] = False
-            result['missing_components'].append({
-                'product': _('System'),
-                'required': 0,
-                'available': 0,
-                'shortage': 0,
-                'reason': _('No warehouse location found for stock check')
-            })
-            return result
-        
-        # Check each component
-        for line in bom_lines:
-            component = line.product_id
+        # Resolve stock locations once per distinct key
+        product_ids_by_company = defaultdict(set)
+        locations = {}
+        for product_id, quantity, company_id, warehouse_id in needs:
+            product_ids_by_company[company_id].add(product_id)
+            if (company_id, warehouse_id) not in locations:
+                locations[company_id, warehouse_id] = self._get_stock_location(
+                    company_id=company_id,
+                    warehouse_id=warehouse_id
+                )
+        
+        # Resolve BOMs with one search per company
+        boms = {}
+        for company_id, product_ids in product_ids_by_company.items():
+            bom_map = self.get_pos_bom_bulk(list(product_ids), company_id=company_id)
+            for product_id in product_ids:
+                boms[product_id, company_id] = bom_map[product_id]
+        
+        # Load the lines of all BOMs together, only with the columns used
+        all_boms = self.env['mrp.bom'].union(*(bom for bom in boms.values() if bom))
+        all_boms.fetch(['bom_line_ids'])
+        all_boms.bom_line_ids.fetch(['product_id', 'product_qty', 'product_uom_id'])
+        
+        # Read on-hand quantities of all components in one query
+        component_ids = set(all_boms.bom_line_ids.product_id.ids)
+        location_ids = {location.id for location in locations.values() if location}
+        available_by_key = self._get_components_available_qty(component_ids, location_ids)
+        
+        for need in needs:
+            product_id, quantity, company_id, warehouse_id = need
+            result = {
+                'available': True,
+                'missing_components': [],
+            }
+            results[need] = result
             
-            # Calculate required quantity based on BOM quantity
-            required_qty = line.product_qty * quantity
+            bom = boms[product_id, company_id]
+            if not bom:
+                result['available'] = False
+                result['missing_components'].append({
+                    'product': product_by_id[product_id].product_tmpl_id.name,
+                    'required': quantity,
+                    'available': 0,
+                    'shortage': quantity,
+                    'reason': _('No BOM found')
+                })
+                continue
             
-            # Get available quantity using Odoo standard method
-            # This handles reservations, incoming, outgoing properly
-            available_qty = self.env['stock.quant']._get_available_quantity(
-                component, 
-                location,
-                strict=True
-            )
+            if not bom.bom_line_ids:
+                continue
             
-            if available_qty < required_qty:
+            location = locations[company_id, warehouse_id]
+            if not location:
                 result['available'] = False
                 result['missing_components'].append({
-                    'product': component.display_name,
-                    'required': required_qty,
-                    'available': available_qty,
-                    'shortage': required_qty - available_qty,
-                    'uom': line.product_uom_id.name,
+                    'product': _('System'),
+                    'required': 0,
+                    'available': 0,
+                    'shortage': 0,
+                    'reason': _('No warehouse location found for stock check')
                 })
+                continue
+            
+            result['missing_components'] = self._get_missing_components(
+                bom.bom_line_ids, quantity, location, available_by_key
+            )
+            result['available'] = not result['missing_components']
+        
+        return results
+
+    @api.model
+    def _get_stock_location(self, company_id=None, warehouse_id=None):
+        """
+        Get the stock location used to check components availability.
+        
+        :param company_id: Company ID, used when no warehouse is given or found
+        :param warehouse_id: Warehouse ID (usually from the POS config)
+        :return: stock.location record or False
+        """
+        Warehouse = self.env['stock.warehouse']
+        
+        if warehouse_id:
+            # Warehouse IDs come from the POS config: read them directly and only
+            # fall back to the company warehouse if the record has been deleted
+            try:
+                location = Warehouse.browse(warehouse_id).lot_stock_id
+            except MissingError:
+                location = False
+            if location:
+                return location
+        
+        # Use company's main warehouse
+        warehouse = Warehouse.search_fetch([
+            ('company_id', '=', company_id or self.env.company.id)
+        ], ['lot_stock_id'], limit=1)
+        return warehouse.lot_stock_id or False
+
+    @api.model
+    def _get_components_available_qty(self, component_ids, location_ids):
+        """
+        Get available quantities of components in the given locations.
+        
+        Mirrors stock.quant._get_available_quantity(strict=True): only quants
+        directly in the location, without lot, package or owner, are counted.
+        
+        :param component_ids: product.product IDs
+        :param location_ids: stock.location IDs
+        :return: dict mapping (location_id, product_id) to available quantity
+        """
+        if not component_ids or not location_ids:
+            return {}
         
-        return result
+        self.env['stock.quant'].flush_model([
+            'product_id', 'location_id', 'lot_id', 'package_id', 'owner_id',
+            'quantity', 'reserved_quantity',
+        ])
+        self.env.cr.execute("""
+            SELECT location_id, product_id, SUM(quantity) - SUM(reserved_quantity)
+              FROM stock_quant
+             WHERE location_id = ANY(%s)
+               AND product_id = ANY(%s)
+               AND lot_id IS NULL
+               AND package_id IS NULL
+               AND owner_id IS NULL
+          GROUP BY location_id, product_id
+        """, [list(location_ids), list(component_ids)])
+        return {
+            (location_id, product_id): max(available_qty, 0.0)
+            for location_id, product_id, available_qty in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _get_missing_components(self, bom_lines, quantity, location, available_by_key):
+        """
+        Compare the components required by BOM lines with their available quantities.
+        
+        :param bom_lines: mrp.bom.line records of the BOM to manufacture
+        :param quantity: Quantity to manufacture
+        :param location: stock.location record the components are taken from
+        :param available_by_key: result of _get_components_available_qty()
+        :return: list of missing components, as in check_components_availability()
+        """
+        # Load the needed columns of all lines in one query
+        bom_lines.fetch(['product_id', 'product_qty', 'product_uom_id'])
+        
+        # Sum BOM quantities per component in the component's own UoM, the one
+        # stock is counted in, then scale once by the quantity
+        bom_qty_by_pid = defaultdict(float)
+        product_by_pid = {}
+        for line in bom_lines:
+            component = line.product_id
+            bom_qty_by_pid[component.id] += line.product_uom_id._compute_quantity(
+                line.product_qty, component.uom_id, round=False
+            )
+            product_by_pid[component.id] = component
+        
+        location_id = location.id
+        required_by_pid = {
+            product_id: bom_qty * quantity
+            for product_id, bom_qty in bom_qty_by_pid.items()
+        }
+        available_by_pid = {
+            product_id: available_by_key.get((location_id, product_id), 0.0)
+            for product_id in required_by_pid
+        }
+        
+        # Compare at the component UoM precision, so that sums of converted
+        # quantities do not turn exact stock into a shortage
+        short_pids = [
+            product_id
+            for product_id, required_qty in required_by_pid.items()
+            if float_compare(
+                required_qty, available_by_pid[product_id],
+                precision_rounding=product_by_pid[product_id].uom_id.rounding,
+            ) > 0
+        ]
+        
+        # Common case: everything is in stock
+        if not short_pids:
+            return []
+        
+        # Names are only read for the missing components
+        return [
+            {
+                'product': product_by_pid[product_id].display_name,
+                'required': required_by_pid[product_id],
+                'available': available_by_pid[product_id],
+                'shortage': required_by_pid[product_id] - available_by_pid[product_id],
+                'uom': product_by_pid[product_id].uom_id.name,
+            }
+            for product_id in short_pids
+        ]